@@ -17,13 +17,14 @@
 #include "../include/eepromops.h"
 #include "../include/debug.h"
 
+// Fields ordered by size to avoid padding holes (24 bytes instead of 32 on LP64)
 typedef struct EEPROMBlock {
     uint8_t *data;
+    struct EEPROMBlock *next;
+    int fid;
     uint16_t size;
     bool dirty;
     bool saveonwrite;
-    struct EEPROMBlock *next;
-    int fid;
 } EEPROMBlock;
 
 // Head of our internal linked list for in-memory EEPROM representation
@@ -35,6 +36,7 @@ static uint16_t eeprom_getsize(EEPROMDescriptor eeprom_descriptor);
 // Internal function to create a new EEPROM block
 static EEPROMBlock* create_eeprom_block(int fid, size_t size);
 static EEPROMBlock* find_block(int fid);
+static ssize_t eeprom_save_range(EEPROMBlock *block, uint16_t offset, uint16_t count);
 ssize_t eeprom_save(EEPROMDescriptor desc);
 
 
@@ -66,17 +68,12 @@ EEPROMDescriptor eeprom_open(const char *pathname, uint16_t eeprom_size) {
         desc.eeprom_size = eeprom_size;
     }
 
-    uint8_t *buffer = (uint8_t *)malloc(desc.eeprom_size);
-    if (!buffer) return desc;  // handle error
-
-    lseek(desc.eeprom_fid, 0, SEEK_SET);
-    read(desc.eeprom_fid, buffer, desc.eeprom_size);
-
     EEPROMBlock *block = create_eeprom_block(desc.eeprom_fid, desc.eeprom_size);
     if (!block) return desc;  // handle error
 
-    memcpy(block->data, buffer, desc.eeprom_size);
-    free(buffer);
+    // Read EEPROM content straight into the block, no intermediate buffer
+    lseek(desc.eeprom_fid, 0, SEEK_SET);
+    read(desc.eeprom_fid, block->data, desc.eeprom_size);
 
     block->dirty= false;
     block->saveonwrite = true;
@@ -120,14 +117,19 @@ uint16_t eeprom_write(EEPROMDescriptor eeprom_descriptor, const void *buf, uint1
     // Double check that the block size is correct
     if (offset + count > block->size) return -1;
 
+    bool was_dirty = block->dirty;
     memcpy(block->data + offset, buf, count);
 
     block->dirty = true;
 
     if (block->saveonwrite) {
-        // TODO: add check for write errors
-        count = eeprom_save(eeprom_descriptor);
-        debug("saved %i bytes\n", count);
+        // Persist only the modified range, unless earlier changes are still pending
+        ssize_t saved = was_dirty ? eeprom_save(eeprom_descriptor) : eeprom_save_range(block, offset, count);
+        if (saved < 0) {
+            debug("eeprom_write: save failed\n");
+            return -1;
+        }
+        debug("saved %li bytes\n", saved);
         block->dirty = false;
     }
 
@@ -204,11 +206,15 @@ EEPROMBlock *find_block(int fid) {
 ssize_t eeprom_save(EEPROMDescriptor desc) {
     EEPROMBlock *block = find_block(desc.eeprom_fid);
     if (!block) return -1;
+    return eeprom_save_range(block, 0, block->size);
+}
+
+static ssize_t eeprom_save_range(EEPROMBlock *block, uint16_t offset, uint16_t count) {
     ssize_t current = 0;
     ssize_t written = 0;
-    while (current < block->size) {
-        lseek(desc.eeprom_fid, current, SEEK_SET);
-        written = write(desc.eeprom_fid, block->data + current, block->size - current);
+    while (current < count) {
+        // pwrite: positioned write in one syscall, no separate lseek
+        written = pwrite(block->fid, block->data + offset + current, count - current, offset + current);
         if (written <= 0) {
             debug("eeprom_save: write failed %i\n",errno);
             return -1;
@@ -217,7 +223,5 @@ ssize_t eeprom_save(EEPROMDescriptor desc) {
 
     }
 
-    // lseek(desc.eeprom_fid, 0, SEEK_SET);
     return current;
-    //write(desc.eeprom_fid, block->data, block->size);
 }
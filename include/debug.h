@@ -14,11 +14,15 @@ extern "C" {
 #endif
 
 
+#ifdef DEBUG
 #if DEBUG==1
 #define debug(fmt, ...) printf("[D!] " fmt, ##__VA_ARGS__)
 #else
 #define debug(fmt, ...) printf("[D] %s:%i: " fmt, __FILE__, __LINE__, ##__VA_ARGS__)
-//#define debug(...)
+#endif
+#else
+// compiled out, but keep format/argument checking
+#define debug(fmt, ...) do { if (0) printf(fmt, ##__VA_ARGS__); } while (0)
 #endif
 
 #ifdef __cplusplus
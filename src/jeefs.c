@@ -5,7 +5,11 @@
  */
 
 #include <string.h>
+#ifdef JEEFS_USE_ZLIB_NG
+#include <zlib-ng.h>
+#else
 #include <zlib.h>
+#endif
 #include <assert.h>
 
 #include "jeefs.h"
@@ -15,10 +19,10 @@
 
 // Internal functions
 
-// use libz implementation of crc32
+// use libz (or zlib-ng if JEEFS_USE_ZLIB_NG) implementation of crc32
 static uint32_t calculateCRC32(const uint8_t *data, size_t length);
 static int16_t EEPROM_FindFile(EEPROMDescriptor eeprom_descriptor, const char *filename, JEEFSFileHeader *header, uint16_t *address);
-static uint16_t EEPROM_getNextFileAddress(EEPROMDescriptor eeprom_descriptor, uint16_t currentAddress);
+static inline bool EEPROM_FileNameIsValid(const char *filename);
 static inline bool EEPROM_ByteIsEmpty(char var);
 static inline bool EEPROM_WordIsEmpty(uint16_t var);
 static inline bool EEPROM_QWordIsEmpty(uint32_t var);
@@ -58,17 +62,18 @@ int16_t EEPROM_ListFiles(EEPROMDescriptor eeprom_descriptor, char fileList[][FIL
         }
         strncpy(fileList[count], fileHeader.name, FILE_NAME_LENGTH);
         count++;
-        currentAddress = EEPROM_getNextFileAddress(eeprom_descriptor, currentAddress);
-        if (currentAddress == 0) {
+        // files are stored in ascending order, a link backwards is the end of list or corruption
+        if (fileHeader.nextFileAddress <= currentAddress) {
             break; // End of file list
         }
+        currentAddress = fileHeader.nextFileAddress;
     }
 
     return count;
 }
 
 int16_t EEPROM_ReadFile(EEPROMDescriptor eeprom_descriptor, const char *filename, uint8_t *buffer, uint16_t bufferSize) {
-    if (!filename || strlen(filename) > FILE_NAME_LENGTH)
+    if (!EEPROM_FileNameIsValid(filename))
         return FILENAMENOTVALID;
 
     if (!buffer || bufferSize == 0)
@@ -90,7 +95,7 @@ int16_t EEPROM_ReadFile(EEPROMDescriptor eeprom_descriptor, const char *filename
 
 
 int16_t EEPROM_WriteFile(EEPROMDescriptor eeprom_descriptor, const char *filename, const uint8_t *data, uint16_t dataSize) {
-    if (!filename || strlen(filename) > FILE_NAME_LENGTH)
+    if (!EEPROM_FileNameIsValid(filename))
         return FILENAMENOTVALID;
 
     if (!data || dataSize == 0)
@@ -111,14 +116,32 @@ int16_t EEPROM_WriteFile(EEPROMDescriptor eeprom_descriptor, const char *filenam
         return EEPROM_AddFile(eeprom_descriptor, filename, data, dataSize);
     }
 
-    // Overwrite the file content
-    if (eeprom_write(eeprom_descriptor, data, dataSize, fileAddress + sizeof(JEEFSFileHeader)) != dataSize) {
-        return 0;  // Write error
+    // dataSize matches the on-disk header, which may be corrupt: keep the file within the eeprom
+    if (fileAddress + sizeof(JEEFSFileHeader) + (uint32_t) dataSize > eeprom_descriptor.eeprom_size) {
+        debug("EEPROM_WriteFile: file %s exceeds eeprom size\n", filename);
+        return EEPROMCORRUPTED;
     }
 
-    // Update the CRC
-    fileHeader.crc32 = calculateCRC32(data, dataSize);
-    eeprom_write(eeprom_descriptor, &fileHeader, sizeof(JEEFSFileHeader), fileAddress);
+    uint32_t crc32 = calculateCRC32(data, dataSize);
+    uint32_t fileSize = sizeof(JEEFSFileHeader) + dataSize;
+    uint8_t fileBuffer[fileSize];
+
+    // Content unchanged: skip the write to save EEPROM write cycles
+    if (fileHeader.crc32 == crc32
+        && eeprom_read(eeprom_descriptor, fileBuffer, dataSize, fileAddress + sizeof(JEEFSFileHeader)) == dataSize
+        && memcmp(fileBuffer, data, dataSize) == 0) {
+        debug("EEPROM_WriteFile: file %s unchanged, skip write\n", filename);
+        return dataSize;
+    }
+
+    // Update the CRC and overwrite header and content with a single write
+    fileHeader.crc32 = crc32;
+    memcpy(fileBuffer, &fileHeader, sizeof(JEEFSFileHeader));
+    memcpy(fileBuffer + sizeof(JEEFSFileHeader), data, dataSize);
+
+    if (eeprom_write(eeprom_descriptor, fileBuffer, fileSize, fileAddress) != fileSize) {
+        return 0;  // Write error
+    }
 
     return dataSize;
 }
@@ -130,8 +153,7 @@ int16_t EEPROM_AddFile(EEPROMDescriptor eeprom_descriptor, const char *filename,
     /**
      * 1. check filename
      * 2. check data & datasize
-     * 3. check FindFile to existence
-     * 4. find free space
+     * 3. check existence and find free space in a single pass
      *    a) loop until found:
      *    - empty/broken file header
      *    - nextaddress is zero(FF)/overspace
@@ -141,7 +163,7 @@ int16_t EEPROM_AddFile(EEPROMDescriptor eeprom_descriptor, const char *filename,
      *
      */
 
-    if (!filename || strlen(filename) > FILE_NAME_LENGTH) {
+    if (!EEPROM_FileNameIsValid(filename)) {
         debug("EEPROM_AddFile: %s %s %u\n", "FILENAMENOTVALID", filename, dataSize);
         return FILENAMENOTVALID;
     }
@@ -153,19 +175,11 @@ int16_t EEPROM_AddFile(EEPROMDescriptor eeprom_descriptor, const char *filename,
 
 
     uint16_t currentAddress = sizeof(JEEPROMHeader); // Starting after the EEPROM header
-    uint16_t previousAddress;
+    uint16_t previousAddress = 0;
     JEEFSFileHeader currentFileHeader;
-
-    if (EEPROM_FindFile(eeprom_descriptor, filename, &currentFileHeader, &previousAddress) == 1) {
-        debug("EEPROM_AddFile: file already exists: %s\n", filename);
-        // TODO: Update file or return error?
-        return 0; // File already exists
-    }
-    previousAddress = 0;
+    JEEFSFileHeader previousFileHeader;
     ssize_t readSize;
 
-    debug("EEPROM_AddFile: file %s not found. add new\n", filename);
-
     while (!EEPROM_WordIsEmpty(currentAddress) && currentAddress < eeprom_descriptor.eeprom_size - sizeof(JEEFSFileHeader)) {
 
         readSize = eeprom_read(eeprom_descriptor, &currentFileHeader, sizeof(JEEFSFileHeader), currentAddress);
@@ -176,6 +190,13 @@ int16_t EEPROM_AddFile(EEPROMDescriptor eeprom_descriptor, const char *filename,
             return EEPROMREADERROR; // Read error
         }
 
+        // the walk to the free space visits every file, so check existence on the way
+        if (strncmp(currentFileHeader.name, filename, FILE_NAME_LENGTH) == 0) {
+            debug("EEPROM_AddFile: file already exists: %s\n", filename);
+            // TODO: Update file or return error?
+            return 0; // File already exists
+        }
+
         if (EEPROM_ByteIsEmpty(currentFileHeader.name[0])
         || EEPROM_WordIsEmpty(currentFileHeader.dataSize)
         ||
@@ -190,6 +211,7 @@ int16_t EEPROM_AddFile(EEPROMDescriptor eeprom_descriptor, const char *filename,
         // if (currentFileHeader.crc32 == calculateCRC32(data, dataSize))
 
         previousAddress = currentAddress;
+        previousFileHeader = currentFileHeader;
         // TODO: select corruption of all header or only nextFileAddress?
         /*if(currentFileHeader.nextFileAddress != currentFileHeader.dataSize + sizeof (JEEFSFileHeader)) {
             // TODO: fix corruption, maybe restore or return error?
@@ -201,6 +223,8 @@ int16_t EEPROM_AddFile(EEPROMDescriptor eeprom_descriptor, const char *filename,
 
     }
 
+    debug("EEPROM_AddFile: file %s not found. add new\n", filename);
+
     // Exit from loop in search of empty space
     // assume that currentAddress is empty or corrupted
     // assume that previousAddress is valid or zero
@@ -209,10 +233,9 @@ int16_t EEPROM_AddFile(EEPROMDescriptor eeprom_descriptor, const char *filename,
     // write code below:
 
     if (previousAddress) {
-        // TODO: check on read error
-        readSize = eeprom_read(eeprom_descriptor, &currentFileHeader, sizeof(JEEFSFileHeader), previousAddress);
-        currentFileHeader.nextFileAddress = previousAddress + sizeof(JEEFSFileHeader) + currentFileHeader.dataSize;
-        currentAddress = currentFileHeader.nextFileAddress;
+        // previous file header is kept from the loop, no need to re-read it
+        previousFileHeader.nextFileAddress = previousAddress + sizeof(JEEFSFileHeader) + previousFileHeader.dataSize;
+        currentAddress = previousFileHeader.nextFileAddress;
     } else
         currentAddress = sizeof(JEEPROMHeader);
 
@@ -224,7 +247,7 @@ int16_t EEPROM_AddFile(EEPROMDescriptor eeprom_descriptor, const char *filename,
 
     // TODO: check on write error
     if (previousAddress)
-        readSize = eeprom_write(eeprom_descriptor, &currentFileHeader, sizeof(JEEFSFileHeader), previousAddress);
+        readSize = eeprom_write(eeprom_descriptor, &previousFileHeader, sizeof(JEEFSFileHeader), previousAddress);
 
 
     // Prepare and write the new file header
@@ -235,18 +258,16 @@ int16_t EEPROM_AddFile(EEPROMDescriptor eeprom_descriptor, const char *filename,
     currentFileHeader.nextFileAddress = 0; // Currently, it's the last file
 
 
-    // Write the new file header
-    ssize_t writeSize;
-    writeSize = eeprom_write(eeprom_descriptor, &currentFileHeader, sizeof(JEEFSFileHeader), currentAddress);
-    if (writeSize != sizeof(JEEFSFileHeader)) {
-        debug("EEPROM_AddFile: write lastFile header eeprom error %s %li != %li\n", filename, writeSize, sizeof(JEEFSFileHeader));
-        return -1; // Write error
-    }
+    // Write the new file header and data with a single write, they are contiguous
+    uint16_t fileSize = sizeof(JEEFSFileHeader) + dataSize;
+    uint8_t fileBuffer[fileSize];
+    memcpy(fileBuffer, &currentFileHeader, sizeof(JEEFSFileHeader));
+    memcpy(fileBuffer + sizeof(JEEFSFileHeader), data, dataSize);
 
-    // Write the file data
-    writeSize = eeprom_write(eeprom_descriptor, data, dataSize, currentAddress + sizeof(JEEFSFileHeader));
-    if (writeSize != dataSize) {
-        debug("EEPROM_AddFile: write data eeprom error %s %lu != %i\n", filename, writeSize, dataSize);
+    ssize_t writeSize;
+    writeSize = eeprom_write(eeprom_descriptor, fileBuffer, fileSize, currentAddress);
+    if (writeSize != fileSize) {
+        debug("EEPROM_AddFile: write file eeprom error %s %li != %i\n", filename, writeSize, fileSize);
         return -1; // Write error
     }
     debug("EEPROM_AddFile: write data eeprom ok %s %li seek:%i\n", filename, writeSize, currentAddress);
@@ -257,7 +278,7 @@ int16_t EEPROM_AddFile(EEPROMDescriptor eeprom_descriptor, const char *filename,
 
 
 int16_t EEPROM_DeleteFile(EEPROMDescriptor descriptor, const char *filename) {
-    if (!filename || strlen(filename) > FILE_NAME_LENGTH)
+    if (!EEPROM_FileNameIsValid(filename))
         return FILENAMENOTVALID;
 
     JEEFSFileHeader header;
@@ -269,38 +290,57 @@ int16_t EEPROM_DeleteFile(EEPROMDescriptor descriptor, const char *filename) {
     }
 
     // The address after the file we're deleting
-    uint16_t nextAddress = address + sizeof(JEEFSFileHeader) + header.dataSize;
-
-    // Move all subsequent files up to fill the space of the deleted file
-    uint16_t shiftSize = sizeof(JEEFSFileHeader) + header.dataSize;
-    uint8_t buffer[shiftSize];  // Using a buffer equal to the deleted file size for simplicity
-    uint16_t readAddress = nextAddress;
-    ssize_t bytesRead;
-
-    while (readAddress < descriptor.eeprom_size) {
-        bytesRead = eeprom_read(descriptor, buffer, shiftSize, readAddress);
-        if (bytesRead <= 0) {
-            // We've hit the end of our valid data or encountered an error
-            break;
-        }
+    uint32_t shiftSize = sizeof(JEEFSFileHeader) + header.dataSize;
+    if (address + shiftSize > descriptor.eeprom_size) {
+        debug("EEPROM_DeleteFile: file %s exceeds eeprom size\n", filename);
+        return EEPROMCORRUPTED;
+    }
+    uint16_t nextAddress = address + shiftSize;
 
-        eeprom_write(descriptor, buffer, bytesRead, readAddress - shiftSize);
+    // Move all subsequent files up to fill the space of the deleted file:
+    // one read of the tail and one write of the used files plus the freed space
+    uint16_t tailSize = descriptor.eeprom_size - nextAddress;
+    uint8_t buffer[tailSize + shiftSize];
 
-        readAddress += bytesRead;
+    if (tailSize && eeprom_read(descriptor, buffer, tailSize, nextAddress) != tailSize) {
+        debug("EEPROM_DeleteFile: read eeprom error %s\n", filename);
+        return EEPROMREADERROR;
     }
 
-    // Clear out the remaining space
-    uint8_t clearByte = EEPROM_EMPTYBYTE;
-    for (uint16_t i = 0; i < shiftSize && (readAddress - i) < descriptor.eeprom_size; i++) {
-        eeprom_write(descriptor, &clearByte, 1, readAddress - i - 1);
+    // Moved files keep their links, shift them down by the deleted file size.
+    // Files are contiguous, so the end of the last linked file bounds the used space
+    uint32_t usedEnd = nextAddress;
+    uint16_t linkAddress = header.nextFileAddress == nextAddress ? nextAddress : 0;
+    while (linkAddress && linkAddress <= descriptor.eeprom_size - sizeof(JEEFSFileHeader)) {
+        JEEFSFileHeader *moved = (JEEFSFileHeader *) (buffer + (linkAddress - nextAddress));
+        uint16_t movedNext = moved->nextFileAddress;
+        // running maximum: a corrupt size may run past the following files
+        uint32_t movedEnd = linkAddress + sizeof(JEEFSFileHeader) + moved->dataSize;
+        if (movedEnd > usedEnd)
+            usedEnd = movedEnd;
+        if (usedEnd > descriptor.eeprom_size)
+            usedEnd = descriptor.eeprom_size; // broken size, move the whole tail
+        if (EEPROM_WordIsEmpty(movedNext)
+            || movedNext > descriptor.eeprom_size - sizeof(JEEFSFileHeader)
+            || movedNext <= linkAddress)
+            break; // last file or broken link, keep it as is
+        moved->nextFileAddress = movedNext - shiftSize;
+        linkAddress = movedNext;
+    }
+
+    // Only the used files move, clear out the freed space right after them
+    uint16_t moveSize = usedEnd - nextAddress;
+    memset(buffer + moveSize, EEPROM_EMPTYBYTE, shiftSize);
+    if (eeprom_write(descriptor, buffer, moveSize + shiftSize, address) != moveSize + shiftSize) {
+        debug("EEPROM_DeleteFile: write eeprom error %s\n", filename);
+        return -1;
     }
 
     return 1;  // Successfully deleted
 }
 
 int16_t EEPROM_FindFile(EEPROMDescriptor eeprom_descriptor, const char *filename, JEEFSFileHeader *header, uint16_t *address) {
-    if (!filename || strlen(filename) > FILE_NAME_LENGTH)
-        return FILENAMENOTVALID;
+    // filename is already validated by the public API callers
 
     uint16_t currentAddress = sizeof(JEEPROMHeader); // Starting after the EEPROM header
 
@@ -322,25 +362,22 @@ int16_t EEPROM_FindFile(EEPROMDescriptor eeprom_descriptor, const char *filename
             return 1; // File found
         }
 
-        currentAddress = EEPROM_getNextFileAddress(eeprom_descriptor, currentAddress);
-        if (currentAddress == 0) {
+        // files are stored in ascending order, a link backwards is the end of list or corruption
+        if (fileHeader.nextFileAddress <= currentAddress) {
             break; // End of file list
         }
+        currentAddress = fileHeader.nextFileAddress;
     }
 
     return 0; // File not found
 }
 
 inline uint32_t calculateCRC32(const uint8_t *data, size_t length) {
+#ifdef JEEFS_USE_ZLIB_NG
+    return zng_crc32(0L, data, length);
+#else
     return crc32(0L, data, length);
-}
-
-uint16_t EEPROM_getNextFileAddress(EEPROMDescriptor eeprom_descriptor, uint16_t currentAddress) {
-    JEEFSFileHeader fileHeader;
-    if (eeprom_read(eeprom_descriptor, &fileHeader, sizeof(JEEFSFileHeader), currentAddress) != sizeof(JEEFSFileHeader)) {
-        return 0; // Error reading header
-    }
-    return fileHeader.nextFileAddress;
+#endif
 }
 
 
@@ -359,6 +396,11 @@ int16_t EEPROM_HeaderCheckConsistency(EEPROMDescriptor eeprom_descriptor)
         debug("EEPROM_HeaderCheckConsistency: magic error %.8s\n", header.magic);
         return -1;
     }
+    // erased/unwritten crc field (0x00000000 or 0xFFFFFFFF), skip crc calculation
+    if (EEPROM_QWordIsEmpty(crc32old)) {
+        debug("EEPROM_HeaderCheckConsistency: crc32 empty %x\n", crc32old);
+        return -1;
+    }
     uint32_t crc32_calc = calculateCRC32((uint8_t *) &header, sizeof(JEEPROMHeader) - sizeof((&header)->crc32));
     if (crc32_calc != crc32old) {
         debug("EEPROM_HeaderCheckConsistency: crc32 error %u != %u\n", crc32_calc, crc32old);
@@ -381,6 +423,11 @@ int EEPROM_FormatEEPROM(EEPROMDescriptor ep){
     return 1;
 }
 
+inline bool EEPROM_FileNameIsValid(const char *filename) {
+    // strnlen stops after FILE_NAME_LENGTH + 1 bytes instead of scanning the whole string
+    return filename && strnlen(filename, FILE_NAME_LENGTH + 1) <= FILE_NAME_LENGTH;
+}
+
 inline bool EEPROM_ByteIsEmpty(char var) {
     return var == '\xFF' || var == '\0';
 }
@@ -72,9 +72,8 @@ void test0(void) {
     lseek(ep.eeprom_fid, 0, SEEK_SET);
     assert(read(ep.eeprom_fid, buf2, ep.eeprom_size)==ep.eeprom_size);
     printf("Check EEPROM data consistency\n");
-    for(int i=sizeof(JEEPROMHeader); i < ep.eeprom_size; i++) {
-        assert("\nCheck EEPROM data consistency failed\n" && buf[i] == buf2[i]);
-    }
+    assert("\nCheck EEPROM data consistency failed\n" &&
+           memcmp(buf + sizeof(JEEPROMHeader), buf2 + sizeof(JEEPROMHeader), ep.eeprom_size - sizeof(JEEPROMHeader)) == 0);
 
     EEPROM_CloseEEPROM(ep);
 }
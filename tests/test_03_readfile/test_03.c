@@ -18,9 +18,10 @@
 #include "debug.h"
 #include "eepromerr.h"
 
-void test1();
+// separate image, so test does not depend on the shared test eeprom state
+#define TEST_CORRUPT_EEPROM_FILENAME TEST_EEPROM_PATH "/" "eeprom_corrupt.bin"
 
-void test2();
+void test3(void);
 
 int main() {
     printf("Test 03! DEBUG:%i\n",DEBUG);
@@ -33,8 +34,51 @@ int main() {
     debug("TEST_DIR: %s TEST_FILENAME: %s TEST_EEPROM_PATH: %s TEST_EEPROM_FILENAME: %s TEST_EEPROM_SIZE: %d\ncur_dir: %s\n",
           TEST_DIR, TEST_FILENAME, TEST_EEPROM_PATH, TEST_EEPROM_FILENAME, TEST_EEPROM_SIZE, dir);
 
+    int teeprom = open(TEST_CORRUPT_EEPROM_FILENAME, O_CREAT | O_RDWR, 0666);
+    ftruncate(teeprom, 0);
+    ftruncate(teeprom, TEST_EEPROM_SIZE);
+    close(teeprom);
+
+    test3();
+
+    printf("+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++\n Test 3 - passed\n+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++\n");
 
     // END: delete test files
     //delete_files(TEST_DIR, TEST_FILENAME, 5);
     return 0;
 }
+
+// file list with a link back to the first file must not hang lookups
+void test3(void) {
+    EEPROMDescriptor ep = EEPROM_OpenEEPROM(TEST_CORRUPT_EEPROM_FILENAME, 0);
+    assert(("Check eeprom_open result", ep.eeprom_fid > 0));
+    EEPROM_FormatEEPROM(ep);
+
+    char filename[100];
+    uint8_t filedata[8192];
+    int i, err;
+    for (i = 0; i < 2; i++) {
+        sprintf(filename, "%s_%d", TEST_FILENAME, i);
+        err = EEPROM_AddFile(ep, filename, (const uint8_t *) test_files[i], strlen(test_files[i]) + 1);
+        assert("Check EEPROM_AddFile" && err == strlen(test_files[i]) + 1);
+    }
+
+    // corrupt: link the second (last) file back to the first one
+    JEEFSFileHeader fileHeader;
+    uint16_t secondAddress = sizeof(JEEPROMHeader) + sizeof(JEEFSFileHeader) + strlen(test_files[0]) + 1;
+    assert(eeprom_read(ep, &fileHeader, sizeof(JEEFSFileHeader), secondAddress) == sizeof(JEEFSFileHeader));
+    assert("Check second file header" && strcmp(fileHeader.name, TEST_FILENAME "_1") == 0);
+    fileHeader.nextFileAddress = sizeof(JEEPROMHeader);
+    assert(eeprom_write(ep, &fileHeader, sizeof(JEEFSFileHeader), secondAddress) == sizeof(JEEFSFileHeader));
+
+    err = EEPROM_ReadFile(ep, TEST_FILENAME "_9", filedata, sizeof(filedata));
+    assert("Check not existing file on looped list" && err == FILENOTFOUND);
+    err = EEPROM_ReadFile(ep, TEST_FILENAME "_1", filedata, sizeof(filedata));
+    assert("Check existing file on looped list" && err == strlen(test_files[1]) + 1);
+
+    char fileList[16][FILE_NAME_LENGTH];
+    err = EEPROM_ListFiles(ep, fileList, 16);
+    assert("Check EEPROM_ListFiles on looped list" && err == 2);
+
+    EEPROM_CloseEEPROM(ep);
+}
@@ -0,0 +1,132 @@
+// SPDX-License-Identifier: (GPL-2.0+ or MIT)
+/*
+ * Copyright (c) 2023 JetHome. All rights reserved.
+ * Author: Viacheslav Bocharov <adeep@lexina.in>
+ */
+
+#include <assert.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <unistd.h>
+
+#define DEBUG 1
+
+#include "jeefs.h"
+#include "tests-common.h"
+#include "debug.h"
+#include "eepromerr.h"
+
+// separate image, so test does not depend on the shared test eeprom state
+#define TEST_DELETE_EEPROM_FILENAME TEST_EEPROM_PATH "/" "eeprom_delete.bin"
+
+void test4(void);
+void test5(void);
+void check_file(EEPROMDescriptor ep, int i, bool exists);
+
+int main() {
+    printf("Test 04! DEBUG:%i\n",DEBUG);
+
+    int teeprom = open(TEST_DELETE_EEPROM_FILENAME, O_CREAT | O_RDWR, 0666);
+    ftruncate(teeprom, 0);
+    ftruncate(teeprom, TEST_EEPROM_SIZE);
+    close(teeprom);
+
+    test4();
+
+    printf("+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++\n Test 4 - passed\n+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++\n");
+
+    test5();
+
+    printf("+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++\n Test 5 - passed\n+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++\n");
+    return 0;
+}
+
+void check_file(EEPROMDescriptor ep, int i, bool exists) {
+    char filename[100];
+    uint8_t filedata[8192];
+    int err;
+
+    sprintf(filename, "%s_%d", TEST_FILENAME, i);
+    memset(filedata, 0, sizeof(filedata));
+    err = EEPROM_ReadFile(ep, filename, filedata, sizeof(filedata));
+    debug("check file %s: %i\n", filename, err);
+    if (exists) {
+        assert("Check file exists" && err == strlen(test_files[i]) + 1);
+        assert("Compare file with original" && memcmp(filedata, test_files[i], err) == 0);
+    } else
+        assert("Check file not exists" && err == FILENOTFOUND);
+}
+
+void test4(void) {
+    EEPROMDescriptor ep = EEPROM_OpenEEPROM(TEST_DELETE_EEPROM_FILENAME, 0);
+    assert(("Check eeprom_open result", ep.eeprom_fid > 0));
+    EEPROM_FormatEEPROM(ep);
+
+    char filename[100];
+    int i, err;
+    for (i = 0; i < 4; i++) {
+        sprintf(filename, "%s_%d", TEST_FILENAME, i);
+        err = EEPROM_AddFile(ep, filename, (const uint8_t *) test_files[i], strlen(test_files[i]) + 1);
+        assert("Check EEPROM_AddFile" && err == strlen(test_files[i]) + 1);
+    }
+
+    // delete file in the middle, following files must keep their links
+    assert("Delete middle file" && EEPROM_DeleteFile(ep, TEST_FILENAME "_1") == 1);
+    check_file(ep, 0, true);
+    check_file(ep, 1, false);
+    check_file(ep, 2, true);
+    check_file(ep, 3, true);
+
+    // delete first file
+    assert("Delete first file" && EEPROM_DeleteFile(ep, TEST_FILENAME "_0") == 1);
+    check_file(ep, 0, false);
+    check_file(ep, 2, true);
+    check_file(ep, 3, true);
+
+    // delete last file and add a new one at the end
+    assert("Delete last file" && EEPROM_DeleteFile(ep, TEST_FILENAME "_3") == 1);
+    assert("Delete not existing file" && EEPROM_DeleteFile(ep, TEST_FILENAME "_3") == FILENOTFOUND);
+    err = EEPROM_AddFile(ep, TEST_FILENAME "_4", (const uint8_t *) test_files[4], strlen(test_files[4]) + 1);
+    assert("Check EEPROM_AddFile after delete" && err == strlen(test_files[4]) + 1);
+    EEPROM_CloseEEPROM(ep);
+
+    // check on reopened eeprom
+    ep = EEPROM_OpenEEPROM(TEST_DELETE_EEPROM_FILENAME, 0);
+    check_file(ep, 2, true);
+    check_file(ep, 3, false);
+    check_file(ep, 4, true);
+    EEPROM_CloseEEPROM(ep);
+}
+
+// last file terminated with an erased (0xFFFF) link must keep it after a delete
+void test5(void) {
+    EEPROMDescriptor ep = EEPROM_OpenEEPROM(TEST_DELETE_EEPROM_FILENAME, 0);
+    assert(("Check eeprom_open result", ep.eeprom_fid > 0));
+    EEPROM_FormatEEPROM(ep);
+
+    char filename[100];
+    int i, err;
+    for (i = 0; i < 3; i++) {
+        sprintf(filename, "%s_%d", TEST_FILENAME, i);
+        err = EEPROM_AddFile(ep, filename, (const uint8_t *) test_files[i], strlen(test_files[i]) + 1);
+        assert("Check EEPROM_AddFile" && err == strlen(test_files[i]) + 1);
+    }
+
+    JEEFSFileHeader fileHeader;
+    uint16_t lastAddress = sizeof(JEEPROMHeader) + 2 * sizeof(JEEFSFileHeader)
+                           + strlen(test_files[0]) + 1 + strlen(test_files[1]) + 1;
+    assert(eeprom_read(ep, &fileHeader, sizeof(JEEFSFileHeader), lastAddress) == sizeof(JEEFSFileHeader));
+    assert("Check last file header" && strcmp(fileHeader.name, TEST_FILENAME "_2") == 0);
+    fileHeader.nextFileAddress = 0xFFFF;
+    assert(eeprom_write(ep, &fileHeader, sizeof(JEEFSFileHeader), lastAddress) == sizeof(JEEFSFileHeader));
+
+    assert("Delete middle file" && EEPROM_DeleteFile(ep, TEST_FILENAME "_1") == 1);
+    err = EEPROM_AddFile(ep, TEST_FILENAME "_3", (const uint8_t *) test_files[3], strlen(test_files[3]) + 1);
+    assert("Check EEPROM_AddFile after delete" && err == strlen(test_files[3]) + 1);
+    check_file(ep, 0, true);
+    check_file(ep, 1, false);
+    check_file(ep, 2, true);
+    check_file(ep, 3, true);
+    EEPROM_CloseEEPROM(ep);
+}